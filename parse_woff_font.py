@@ -7,20 +7,80 @@
 
 from fontTools.ttLib import TTFont
 import ddddocr
-from io import BytesIO
+import numpy as np
+import onnxruntime
 from PIL import Image, ImageDraw, ImageFont
-from typing import Dict, Tuple, Optional
+try:
+    import cv2
+except ImportError:  # 未安装OpenCV时使用Pillow缩放
+    cv2 = None
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor
 import os
+import hashlib
 import logging
+import math
+import shelve
 from functools import lru_cache
+from pathlib import Path
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 重采样常量：Pillow 9.1+ 位于 Image.Resampling 中，Pillow-SIMD (基于Pillow 7) 仍直接挂在 Image 上
+_RESAMPLING = getattr(Image, "Resampling", Image)
 
-@lru_cache(maxsize=128)
-def convert_cmap_to_image(cmap_code: int, font_path: str, img_size: int = 1024) -> Image.Image:
+# 调试用：设置为目录路径时，每个渲染出的字符图像都会保存到该目录，默认不保存
+_DEBUG_DUMP_DIR: Optional[str] = None
+
+# OCR模型要求的输入高度，字符图像按此大小渲染即可免去缩放
+_OCR_INPUT_HEIGHT = 64
+
+# high_quality模式下的图像大小
+_HIGH_QUALITY_IMAGE_SIZE = 128
+
+# 每次推理合并识别的字符数
+_BATCH_SIZE = 32
+
+# ddddocr自带的beta模型，以及由其量化得到的INT8模型的缓存路径
+_FP32_MODEL_PATH = os.path.join(os.path.dirname(ddddocr.__file__), "common.onnx")
+# 文件名带版本号，校准预处理变化时递增，使旧的量化模型不再被使用
+_INT8_MODEL_PATH = os.path.join(os.path.expanduser("~"), ".cache", "woff_ocr", "common_int8_v2.onnx")
+
+# 字形轮廓哈希 -> OCR识别结果 的持久化缓存
+_GLYPH_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "woff_ocr", "glyphs.db")
+
+# 字形模板比对时轮廓重采样的点数
+_TEMPLATE_POINTS = 64
+
+# INT8量化时用于校准的字符图像数量上限
+_CALIBRATION_SAMPLES = 64
+
+# 工作进程内的OCR推理会话及字符集，由进程池的initializer在每个进程中创建一次
+_worker_session = None
+_worker_charset = None
+_worker_cached_files = frozenset()
+_worker_debug_dump_dir = None
+
+
+@lru_cache(maxsize=8)
+def _get_font(font_path: str, img_size: int) -> ImageFont.FreeTypeFont:
+    """
+    加载用于渲染字符的字体对象，同一字体文件和图像大小只解析一次
+    
+    Args:
+        font_path: 字体文件路径
+        img_size: 生成图像的大小
+        
+    Returns:
+        ImageFont.FreeTypeFont对象
+    """
+    # 字号取图像大小的75%（64像素图像对应48号字），加上边距后与目标图像大小相近
+    return ImageFont.truetype(font_path, int(img_size * 0.75))
+
+
+def convert_cmap_to_image(cmap_code: int, font_path: str, img_size: int = 64) -> Image.Image:
     """
     将Unicode码点转换为对应字符的图像
     
@@ -42,77 +102,471 @@ def convert_cmap_to_image(cmap_code: int, font_path: str, img_size: int = 1024)
     if cmap_code < 0:
         raise ValueError(f"无效的Unicode码点: {cmap_code}")
 
-    # 创建一个临时的大图像，用于计算实际字符尺寸
-    temp_size = img_size * 2  # 创建一个更大的临时图像
-    temp_img = Image.new("1", (temp_size, temp_size), 255)
-    temp_draw = ImageDraw.Draw(temp_img)
+    image = _convert_unchecked(cmap_code, font_path, img_size)
+    if _DEBUG_DUMP_DIR:
+        _dump_debug_image(image, cmap_code, _DEBUG_DUMP_DIR)
+    return image
+
+
+def _dump_debug_image(image: Image.Image, cmap_code: int, dump_dir: str) -> None:
+    """将渲染出的字符图像保存到调试目录"""
+    image.save(os.path.join(dump_dir, f"{cmap_code}.png"), "PNG")
 
+
+@lru_cache(maxsize=128)
+def _convert_unchecked(cmap_code: int, font_path: str, img_size: int) -> Image.Image:
+    """
+    convert_cmap_to_image的实现，不再检查参数，供已校验过字体文件的内部流程直接调用
+    
+    Args:
+        cmap_code: Unicode码点
+        font_path: 字体文件路径
+        img_size: 生成图像的大小
+        
+    Returns:
+        PIL.Image对象，包含渲染的字符
+    """
     try:
-        font = ImageFont.truetype(font_path, img_size)
+        font = _get_font(font_path, img_size)
     except Exception as e:
         raise ValueError(f"无法加载字体文件: {e}")
 
     # 将 cmap code 转换为字符
     character = chr(cmap_code)
 
-    # 在临时图像中心绘制文本
-    temp_center = temp_size // 2
-    temp_draw.text(
-        (temp_center, temp_center),
+    # 直接由字体度量得到字符的边界框，无需先渲染再扫描像素
+    left, top, right, bottom = font.getbbox(character)
+    width = right - left
+    height = bottom - top
+    if width <= 0 or height <= 0:
+        # 空白字符，返回空白图像
+        return Image.new("1", (img_size, img_size), 255)
+
+    # 按边界框创建正方形画布，确保有足够的边距且字符居中
+    padding = img_size // 10
+    canvas_size = max(width, height) + 2 * padding
+    final_img = Image.new("1", (canvas_size, canvas_size), 255)
+    ImageDraw.Draw(final_img).text(
+        ((canvas_size - width) // 2 - left, (canvas_size - height) // 2 - top),
         character,
-        font=font,
-        anchor="mm"  # 使用锚点参数，以字符中心点为准进行定位
+        font=font
     )
 
-    # 裁剪非空白区域
-    bbox = temp_img.getbbox()
-    if bbox:
-        # 确保有足够的边距
-        padding = img_size // 10
-        left, top, right, bottom = bbox
-        width = right - left
-        height = bottom - top
-
-        # 计算新的裁剪区域，确保居中
-        center_x = (left + right) // 2
-        center_y = (top + bottom) // 2
-
-        # 确保裁剪区域是正方形
-        half_size = max(width, height) // 2 + padding
-        crop_left = max(0, center_x - half_size)
-        crop_top = max(0, center_y - half_size)
-        crop_right = min(temp_size, center_x + half_size)
-        crop_bottom = min(temp_size, center_y + half_size)
-
-        # 裁剪图像
-        cropped_img = temp_img.crop((crop_left, crop_top, crop_right, crop_bottom))
-
-        # 调整到最终尺寸
-        final_img = cropped_img.resize((img_size, img_size), Image.LANCZOS)
-    else:
-        # 如果没有找到边界框，返回原始图像
-        final_img = Image.new("1", (img_size, img_size), 255)
+    # 调整到最终尺寸，OCR对轻微模糊不敏感，使用BILINEAR即可
+    if canvas_size != img_size:
+        final_img = final_img.resize((img_size, img_size), _RESAMPLING.BILINEAR)
 
-    # final_img.save(f"./imgs/{cmap_code}.png",'PNG')
     return final_img
 
 
+def _load_charset() -> List[str]:
+    """
+    获取ddddocr beta模型对应的字符集
+    
+    Returns:
+        字符集列表，下标与模型输出的类别一一对应
+    """
+    try:
+        # ddddocr 1.6+ 将字符集独立为模块
+        from ddddocr.charsets import CHARSET_BETA
+        return CHARSET_BETA
+    except ImportError:
+        # 旧版本字符集保存在DdddOcr实例的私有属性中
+        return ddddocr.DdddOcr(beta=True, show_ad=False)._DdddOcr__charset
+
+
+def _create_ocr_session(intra_op_num_threads: int, model_path: str) -> onnxruntime.InferenceSession:
+    """
+    直接加载OCR模型，创建经过优化配置的ONNX推理会话
+    
+    Args:
+        intra_op_num_threads: 单个算子内部使用的线程数
+        model_path: ONNX模型路径
+        
+    Returns:
+        onnxruntime.InferenceSession对象
+    """
+    sess_options = onnxruntime.SessionOptions()
+    sess_options.intra_op_num_threads = intra_op_num_threads
+    sess_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # 模型声明的输出形状与实际不符，屏蔽onnxruntime每次推理时的警告
+    sess_options.log_severity_level = 3
+
+    return onnxruntime.InferenceSession(model_path, sess_options, providers=["CPUExecutionProvider"])
+
+
+def _image_to_array(image: Image.Image) -> np.ndarray:
+    """
+    按ddddocr的预处理方式将字符图像转换为模型输入
+    
+    Args:
+        image: 字符图像
+        
+    Returns:
+        形状为 (64, W) 的float32数组
+    """
+    if image.mode != "L":
+        image = image.convert("L")
+
+    # 直接以灰度像素缓冲区构造数组，后续缩放和归一化都在numpy中完成
+    array = np.frombuffer(image.tobytes(), dtype=np.uint8).reshape(image.size[1], image.size[0])
+
+    if array.shape[0] != _OCR_INPUT_HEIGHT:
+        width = int(array.shape[1] * (_OCR_INPUT_HEIGHT / array.shape[0]))
+        if cv2 is not None:
+            # OpenCV的INTER_AREA缩小图像时使用SIMD加速，比Pillow更快
+            array = cv2.resize(array, (width, _OCR_INPUT_HEIGHT), interpolation=cv2.INTER_AREA)
+        else:
+            array = np.asarray(image.resize((width, _OCR_INPUT_HEIGHT), _RESAMPLING.LANCZOS))
+
+    # 与ddddocr内置模型一致：归一化到 [-1, 1]
+    return (array.astype(np.float32) / 255.0 - 0.5) / 0.5
+
+
+def _classify_atlas(atlas: Image.Image, cell_count: int) -> List[str]:
+    """
+    对字符图集执行一次OCR推理，并按位置拆分出每个字符的识别结果
+    
+    模型的batch维度固定为1，但输入宽度可变，因此图集为单行等宽排列的字符，
+    根据每个时间步在图集中的位置将CTC输出划分回各个字符。
+    
+    Args:
+        atlas: 单行排列的字符图集
+        cell_count: 图集中的字符数
+        
+    Returns:
+        每个字符的识别结果列表
+    """
+    batch = _image_to_array(atlas)[np.newaxis, np.newaxis, :, :]
+    input_name = _worker_session.get_inputs()[0].name
+    output = _worker_session.run(None, {input_name: batch})[0]
+
+    # 模型输出为 (序列长度, 1, 类别数) 的logits，部分版本直接输出 (1, 序列长度) 的类别下标
+    if output.ndim == 3:
+        indices = output.reshape(-1, output.shape[-1]).argmax(axis=-1)
+    else:
+        indices = output.reshape(-1)
+
+    # 每个时间步对应输入中等宽的一列，按中心位置归属到对应字符
+    steps_per_cell = len(indices) / cell_count
+    results = [[] for _ in range(cell_count)]
+    last_items = [0] * cell_count
+    for step, item in enumerate(indices):
+        cell = min(int((step + 0.5) / steps_per_cell), cell_count - 1)
+        # CTC解码：跳过连续重复的类别和空白类别0
+        if item != last_items[cell] and item != 0:
+            results[cell].append(_worker_charset[item])
+        last_items[cell] = item
+
+    return ["".join(result) for result in results]
+
+
+def _cpu_supports_vnni() -> bool:
+    """
+    检查当前CPU是否支持VNNI指令（INT8推理加速所需）
+    
+    Returns:
+        支持返回True，无法确定时返回False
+    """
+    if "CPUExecutionProvider" not in onnxruntime.get_available_providers():
+        return False
+
+    try:
+        with open("/proc/cpuinfo") as f:
+            cpuinfo = f.read()
+    except OSError:
+        return False
+
+    return "avx512_vnni" in cpuinfo or "avx_vnni" in cpuinfo
+
+
+class _GlyphCalibrationReader:
+    """
+    INT8量化的校准数据读取器，依次提供渲染好的字符图像作为模型输入
+    
+    实现了onnxruntime.quantization.CalibrationDataReader所要求的get_next接口
+    """
+
+    def __init__(self, input_name: str, arrays: List[np.ndarray]):
+        self._inputs = iter([{input_name: array[np.newaxis, np.newaxis, :, :]} for array in arrays])
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        return next(self._inputs, None)
+
+
+def _get_int8_model_path(font_path: str, items: List[Tuple[int, str]], image_size: int) -> str:
+    """
+    获取INT8量化后的OCR模型，首次调用时使用当前字体的字符图像进行静态量化并缓存
+    
+    Args:
+        font_path: 字体文件路径，用于渲染校准图像
+        items: (Unicode码点, glyph名称) 列表
+        image_size: 生成图像的大小
+        
+    Returns:
+        量化模型文件路径
+    """
+    if os.path.exists(_INT8_MODEL_PATH):
+        return _INT8_MODEL_PATH
+
+    # 量化工具依赖onnx包，按需导入
+    import onnx
+    from onnx import version_converter
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    arrays = [
+        _image_to_array(_convert_unchecked(cmap_code, font_path, image_size))
+        for cmap_code, _ in items[:_CALIBRATION_SAMPLES]
+    ]
+    input_name = _create_ocr_session(1, _FP32_MODEL_PATH).get_inputs()[0].name
+
+    os.makedirs(os.path.dirname(_INT8_MODEL_PATH), exist_ok=True)
+    opset_path = f"{_INT8_MODEL_PATH}.{os.getpid()}.opset.tmp"
+    temp_path = f"{_INT8_MODEL_PATH}.{os.getpid()}.tmp"
+    try:
+        # 逐通道量化要求opset >= 13，ddddocr自带模型为opset 12
+        model = onnx.load(_FP32_MODEL_PATH)
+        onnx.save(version_converter.convert_version(model, 13), opset_path)
+
+        quantize_static(
+            opset_path,
+            temp_path,
+            _GlyphCalibrationReader(input_name, arrays),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8
+        )
+
+        # 确认量化模型可以正常推理后再写入缓存
+        _create_ocr_session(1, temp_path).run(None, {input_name: arrays[0][np.newaxis, np.newaxis, :, :]})
+        os.replace(temp_path, _INT8_MODEL_PATH)
+    finally:
+        for path in (opset_path, temp_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    logger.info(f"已生成INT8量化模型: {_INT8_MODEL_PATH}")
+    return _INT8_MODEL_PATH
+
+
+def _init_worker(
+        intra_op_num_threads: int,
+        model_path: str,
+        cached_files: frozenset,
+        font_path: str,
+        image_size: int,
+        debug_dump_dir: Optional[str]
+) -> None:
+    """
+    进程池工作进程的初始化函数，每个进程只创建一次OCR推理会话并预先加载字体
+    
+    Args:
+        intra_op_num_threads: 推理会话使用的线程数
+        model_path: ONNX模型路径
+        cached_files: 缓存目录中已存在的文件名集合
+        font_path: 字体文件路径
+        image_size: 生成图像的大小
+        debug_dump_dir: 主进程的_DEBUG_DUMP_DIR，spawn方式启动的进程无法继承模块变量
+    """
+    global _worker_session, _worker_charset, _worker_cached_files, _worker_debug_dump_dir
+    _worker_cached_files = cached_files
+    _worker_debug_dump_dir = debug_dump_dir
+
+    try:
+        _get_font(font_path, image_size)
+    except Exception:
+        pass  # 加载失败时由各字符的渲染流程记录错误
+    _worker_session = _create_ocr_session(intra_op_num_threads, model_path)
+    _worker_charset = _load_charset()
+
+
+def _decode_batch(args: Tuple[List[Tuple[int, str]], str, int, Optional[str]]) -> List[Tuple[str, str]]:
+    """
+    渲染并识别一批字符，在进程池的工作进程中执行
+    
+    Args:
+        args: ([(Unicode码点, glyph名称), ...], 字体文件路径, 图像大小, 缓存目录) 元组
+        
+    Returns:
+        [(glyph名称, OCR识别结果), ...] 列表，出错时识别结果为空字符串
+    """
+    batch, font_path, image_size, cache_dir = args
+    cache_dir_path = Path(cache_dir) if cache_dir else None
+
+    # 将整批字符绘制到同一张单行图集中，只需一次预处理和一次推理
+    atlas = Image.new("L", (len(batch) * image_size, image_size), 255)
+    rendered = []
+    for index, (cmap_code, glyph_name) in enumerate(batch):
+        try:
+            # 将字体字符转换为图像
+            image = _convert_unchecked(cmap_code, font_path, image_size)
+
+            # 保存图像到缓存（如果启用）
+            if cache_dir_path:
+                cache_name = f"{cmap_code}_{glyph_name}.png"
+                if cache_name not in _worker_cached_files:
+                    image.save(cache_dir_path / cache_name, "PNG")
+
+            if _worker_debug_dump_dir:
+                _dump_debug_image(image, cmap_code, _worker_debug_dump_dir)
+
+            atlas.paste(image, (index * image_size, 0))
+            rendered.append(index)
+
+        except Exception as e:
+            # 出错的字符在图集中保持空白，识别结果为空字符串
+            logger.warning(f"处理字符时出错 (码点: {cmap_code}, 名称: {glyph_name}): {e}")
+
+    try:
+        # 提取图像字符
+        texts = _classify_atlas(atlas, len(batch))
+    except Exception as e:
+        logger.warning(f"批量识别字符时出错 ({batch[0][1]} 等 {len(batch)} 个字符): {e}")
+        texts = [""] * len(batch)
+
+    # 识别结果受图集中相邻字符的影响，i、l等窄字符在图集中可能识别为空，单独重新识别一次
+    for index in rendered:
+        if texts[index]:
+            continue
+        cell = atlas.crop((index * image_size, 0, (index + 1) * image_size, image_size))
+        try:
+            texts[index] = _classify_atlas(cell, 1)[0]
+        except Exception as e:
+            logger.warning(f"识别字符时出错 (码点: {batch[index][0]}, 名称: {batch[index][1]}): {e}")
+
+    return [(glyph_name, text) for (_, glyph_name), text in zip(batch, texts)]
+
+
+def _glyph_digest(glyf_table, glyph_name: str) -> str:
+    """
+    计算字形轮廓的哈希值
+    
+    字体反爬通常只是打乱码点与字形的对应关系，字形轮廓本身保持不变，
+    因此可以用轮廓哈希作为OCR结果的缓存键。
+    
+    Args:
+        glyf_table: 字体的glyf表
+        glyph_name: glyph名称
+        
+    Returns:
+        16字节blake2b摘要的十六进制字符串
+    """
+    coordinates, end_pts, flags = glyf_table[glyph_name].getCoordinates(glyf_table)
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.asarray(coordinates, dtype=np.int32).tobytes())
+    digest.update(np.asarray(end_pts, dtype=np.int32).tobytes())
+    # 只保留on-curve标志位，其余标志位与轮廓形状无关
+    digest.update(bytes(flag & 0x01 for flag in flags))
+    return digest.hexdigest()
+
+
+def _select_model_path(use_int8: bool, font_path: str, items: List[Tuple[int, str]], image_size: int) -> str:
+    """
+    选择OCR使用的模型，INT8量化失败时回退到FP32模型
+    
+    Args:
+        use_int8: 是否使用INT8量化模型，调用方需先确认CPU支持VNNI指令
+        font_path: 字体文件路径，用于量化校准
+        items: 待识别的 (Unicode码点, glyph名称) 列表，用于量化校准
+        image_size: 生成图像的大小
+        
+    Returns:
+        实际使用的ONNX模型路径
+    """
+    if use_int8:
+        try:
+            return _get_int8_model_path(font_path, items, image_size)
+        except Exception as e:
+            logger.warning(f"INT8量化失败，使用FP32模型: {e}")
+    return _FP32_MODEL_PATH
+
+
+def _glyph_cache_prefix(model_path: str, image_size: int) -> str:
+    """
+    生成字形缓存键的前缀，识别结果与所用模型和渲染大小有关
+    
+    Args:
+        model_path: ONNX模型路径
+        image_size: 生成图像的大小
+        
+    Returns:
+        形如 "common_int8_v2-64-" 的前缀
+    """
+    return f"{os.path.splitext(os.path.basename(model_path))[0]}-{image_size}-"
+
+
+def _recognize_glyphs(
+        items: List[Tuple[int, str]],
+        font_path: str,
+        image_size: int,
+        cache_dir: Optional[str],
+        max_workers: Optional[int],
+        model_path: str
+) -> Iterator[List[Tuple[str, str]]]:
+    """
+    使用进程池渲染并识别字符，按批次依次返回识别结果
+    
+    Args:
+        items: 待识别的 (Unicode码点, glyph名称) 列表
+        font_path: 字体文件路径
+        image_size: 生成图像的大小
+        cache_dir: 缓存目录，如果为None则不保存图像
+        max_workers: 进程池大小上限，默认为CPU核心数，实际进程数不超过批次数
+        model_path: ONNX模型路径
+        
+    Returns:
+        迭代器，每次产出一批 [(glyph名称, OCR识别结果), ...]
+    """
+    tasks = (
+        (items[start:start + _BATCH_SIZE], font_path, image_size, cache_dir)
+        for start in range(0, len(items), _BATCH_SIZE)
+    )
+
+    # 预先读取缓存目录中已有的图像，避免逐个字符检查文件是否存在
+    cached_files = frozenset(os.listdir(cache_dir)) if cache_dir else frozenset()
+
+    # 进程数不超过批次数，避免为少量字符启动多余进程并重复加载模型；
+    # 各工作进程平分CPU核心，避免推理线程数超过核心数
+    cpu_count = os.cpu_count() or 1
+    workers = min(max_workers or cpu_count, math.ceil(len(items) / _BATCH_SIZE))
+    intra_op_num_threads = max(1, cpu_count // workers)
+
+    # OCR为CPU密集型任务，使用进程池并行识别各批字符
+    with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(intra_op_num_threads, model_path, cached_files, font_path, image_size, _DEBUG_DUMP_DIR)
+    ) as executor:
+        yield from executor.map(_decode_batch, tasks)
+
+
 def extract_text_from_font(
         font_path: str,
-        image_size: int = 1024,
+        image_size: int = _OCR_INPUT_HEIGHT,
         show_progress: bool = False,
         use_cache: bool = True,
-        cache_dir: Optional[str] = None
+        cache_dir: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        use_int8: bool = True,
+        codepoint_filter: Optional[Callable[[int], bool]] = None,
+        high_quality: bool = False
 ) -> Dict[str, str]:
     """
     从字体文件中提取字符映射关系
     
     Args:
         font_path: 字体文件路径
-        image_size: 生成图像的大小
+        image_size: 生成图像的大小，默认与OCR模型的输入高度一致
         show_progress: 是否显示进度信息
-        use_cache: 是否使用缓存来提高相同字体的处理速度
+        use_cache: 是否按字形轮廓缓存识别结果，跨字体文件复用相同字形的OCR结果，
+            不同的use_int8、image_size（含high_quality）设置分别缓存
         cache_dir: 缓存目录，如果为None则不保存图像
+        max_workers: 进程池大小上限，默认为CPU核心数，实际进程数不超过批次数
+        use_int8: 是否使用INT8量化模型加速OCR，仅在支持VNNI指令的CPU上生效
+        codepoint_filter: 码点过滤函数，只识别返回True的码点，为None时识别全部字符
+        high_quality: 是否以更大的图像渲染字符，识别准确率下降时可开启
         
     Returns:
         字典，键为字体中的glyph名称，值为OCR识别结果
@@ -124,6 +578,9 @@ def extract_text_from_font(
     if not os.path.exists(font_path):
         raise FileNotFoundError(f"字体文件不存在: {font_path}")
 
+    if high_quality:
+        image_size = max(image_size, _HIGH_QUALITY_IMAGE_SIZE)
+
     # 创建缓存目录
     if cache_dir and not os.path.exists(cache_dir):
         os.makedirs(cache_dir)
@@ -136,38 +593,52 @@ def extract_text_from_font(
     except Exception as e:
         raise ValueError(f"无法解析字体文件: {e}")
 
-    # 图像识别模块：DdddOcr
-    ocr = ddddocr.DdddOcr(beta=True, show_ad=False)
+    # 只保留需要识别的码点，跳过无关字符的OCR
+    if codepoint_filter:
+        cmap = {cmap_code: glyph_name for cmap_code, glyph_name in cmap.items() if codepoint_filter(cmap_code)}
 
     font_map = {}
     total_chars = len(cmap)
 
-    for idx, (cmap_code, glyph_name) in enumerate(cmap.items()):
-        if show_progress and idx % max(1, total_chars // 10) == 0:
-            logger.info(f"处理进度: {idx}/{total_chars} ({idx / total_chars * 100:.1f}%)")
-
-        try:
-            # 将字体字符转换为图像
-            image = convert_cmap_to_image(cmap_code, font_path, image_size)
-
-            # 保存图像到缓存（如果启用）
-            if cache_dir:
-                character = chr(cmap_code)
-                cache_path = os.path.join(cache_dir, f"{ord(character)}_{glyph_name}.png")
-                if not os.path.exists(cache_path):
-                    image.save(cache_path, "PNG")
-
-            # 提取图像字符
-            bytes_io = BytesIO()
-            image.save(bytes_io, "PNG")
-            text = ocr.classification(bytes_io.getvalue())
-
+    # INT8量化模型仅在支持VNNI的CPU上生效
+    use_int8 = use_int8 and _cpu_supports_vnni()
+
+    # 根据字形轮廓哈希查找历史识别结果，同一字形在不同字体文件中只需识别一次；
+    # 识别结果与所用模型和渲染大小有关，二者都作为缓存键的一部分
+    digests = {}
+    if use_cache and "glyf" in font:
+        glyf_table = font["glyf"]
+        digests = {glyph_name: _glyph_digest(glyf_table, glyph_name) for glyph_name in dict.fromkeys(cmap.values())}
+        key_prefix = _glyph_cache_prefix(_INT8_MODEL_PATH if use_int8 else _FP32_MODEL_PATH, image_size)
+        os.makedirs(os.path.dirname(_GLYPH_CACHE_PATH), exist_ok=True)
+        with shelve.open(_GLYPH_CACHE_PATH) as glyph_cache:
+            for glyph_name, digest in digests.items():
+                if key_prefix + digest in glyph_cache:
+                    font_map[glyph_name] = glyph_cache[key_prefix + digest]
+
+        if show_progress:
+            logger.info(f"字形缓存命中: {len(font_map)}/{total_chars}")
+
+    items = [(cmap_code, glyph_name) for cmap_code, glyph_name in cmap.items() if glyph_name not in font_map]
+    if items:
+        model_path = _select_model_path(use_int8, font_path, items, image_size)
+        new_results = {}
+        for results in _recognize_glyphs(items, font_path, image_size, cache_dir, max_workers, model_path):
             # 存储映射关系
-            font_map[glyph_name] = text
+            new_results.update(results)
+            font_map.update(results)
 
-        except Exception as e:
-            logger.warning(f"处理字符时出错 (码点: {cmap_code}, 名称: {glyph_name}): {e}")
-            font_map[glyph_name] = ""  # 出错时使用空字符串
+            if show_progress:
+                logger.info(f"处理进度: {len(font_map)}/{total_chars} ({len(font_map) / total_chars * 100:.1f}%)")
+
+        # 保存新的识别结果，识别失败的空结果不写入缓存；
+        # 按实际使用的模型写入，INT8量化失败时的FP32结果不会被当作INT8结果复用
+        if digests:
+            key_prefix = _glyph_cache_prefix(model_path, image_size)
+            with shelve.open(_GLYPH_CACHE_PATH) as glyph_cache:
+                for glyph_name, text in new_results.items():
+                    if text:
+                        glyph_cache[key_prefix + digests[glyph_name]] = text
 
     if show_progress:
         logger.info(f"处理完成: 共 {total_chars} 个字符")
@@ -202,6 +673,145 @@ def get_font_info(font_path: str) -> Tuple[Dict, Dict]:
     return font_info, cmap
 
 
+def get_glyph_outline(glyf_table, glyph_name: str, num_points: int = _TEMPLATE_POINTS) -> Optional[np.ndarray]:
+    """
+    提取字形轮廓，归一化到单位正方形并按弧长等距重采样
+    
+    Args:
+        glyf_table: 字体的glyf表
+        glyph_name: glyph名称
+        num_points: 重采样的点数
+        
+    Returns:
+        形状为 (num_points, 2) 的坐标数组，空白字形返回None
+    """
+    coordinates, end_pts, _ = glyf_table[glyph_name].getCoordinates(glyf_table)
+    points = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+    if len(points) == 0:
+        return None
+
+    # 保持宽高比缩放到单位正方形，消除字号和位置差异
+    origin = points.min(axis=0)
+    scale = (points.max(axis=0) - origin).max() or 1.0
+    points = (points - origin) / scale
+
+    # 将各轮廓闭合后首尾相接，得到一条连续路径
+    contours = []
+    start = 0
+    for end in end_pts:
+        contour = points[start:end + 1]
+        contours.append(np.vstack([contour, contour[:1]]))
+        start = end + 1
+    path = np.vstack(contours)
+
+    # 按弧长等距重采样，使点数不同的轮廓可以逐点比较
+    distances = np.concatenate([[0.0], np.cumsum(np.linalg.norm(np.diff(path, axis=0), axis=1))])
+    targets = np.linspace(0.0, distances[-1], num_points)
+    return np.column_stack([np.interp(targets, distances, path[:, 0]), np.interp(targets, distances, path[:, 1])])
+
+
+def build_glyph_templates(font_path: str, font_map: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    根据已知的字符映射关系生成字形模板
+    
+    多字符的结果同样生成模板，之后遇到相同字形时直接沿用该结果，不会再次触发OCR；
+    识别失败（空字符串）的字形不生成模板，之后仍交给OCR重新识别。
+    
+    Args:
+        font_path: 字体文件路径
+        font_map: 字典，键为glyph名称，值为对应的文本（如人工标注或OCR识别结果）
+        
+    Returns:
+        模板列表，每项为 {"text": 文本, "outline": 归一化后的轮廓坐标列表}，可直接保存为JSON
+    """
+    font = TTFont(font_path)
+    if "glyf" not in font:
+        return []
+
+    glyf_table = font["glyf"]
+    templates = []
+    for glyph_name, text in font_map.items():
+        if not text or glyph_name not in glyf_table:
+            continue
+        # 空白字形无需模板，match_glyph_templates会直接映射为空格
+        outline = get_glyph_outline(glyf_table, glyph_name)
+        if outline is not None:
+            templates.append({"text": text, "outline": outline.tolist()})
+
+    return templates
+
+
+def match_glyph_templates(
+        font_path: str,
+        templates: List[Dict[str, Any]],
+        threshold: float = 1e-3,
+        codepoint_filter: Optional[Callable[[int], bool]] = None
+) -> Tuple[Dict[str, str], List[int]]:
+    """
+    将字体中的字形轮廓与模板逐一比对，直接得到字符映射关系，无需渲染和OCR
+    
+    字体反爬通常只是打乱码点与固定字形的对应关系，因此同一套模板可用于
+    该网站下发的所有字体文件。
+    
+    Args:
+        font_path: 字体文件路径
+        templates: build_glyph_templates生成的模板
+        threshold: 判定匹配的最大均方距离（单位正方形坐标系）
+        codepoint_filter: 码点过滤函数，只比对返回True的码点，为None时比对全部字符
+        
+    Returns:
+        元组 (字典，键为glyph名称，值为匹配到的文本，空白字形为空格; 未匹配到模板的码点列表)
+        
+    Raises:
+        FileNotFoundError: 字体文件不存在
+        ValueError: 字体文件格式错误
+    """
+    if not os.path.exists(font_path):
+        raise FileNotFoundError(f"字体文件不存在: {font_path}")
+
+    try:
+        font = TTFont(font_path)
+        cmap = font.getBestCmap()
+    except Exception as e:
+        raise ValueError(f"无法解析字体文件: {e}")
+
+    if codepoint_filter:
+        cmap = {cmap_code: glyph_name for cmap_code, glyph_name in cmap.items() if codepoint_filter(cmap_code)}
+
+    # 非TrueType轮廓时全部交给OCR处理
+    if "glyf" not in font:
+        return {}, list(cmap)
+
+    # 识别失败的空结果不作为模板，匹配到的字形仍交给OCR重新识别
+    templates = [template for template in templates if template["text"]]
+    glyf_table = font["glyf"]
+    texts = [template["text"] for template in templates]
+    template_outlines = np.asarray([template["outline"] for template in templates], dtype=np.float64)
+    num_points = template_outlines.shape[1] if templates else _TEMPLATE_POINTS
+
+    font_map = {}
+    unmatched = []
+    for cmap_code, glyph_name in cmap.items():
+        outline = get_glyph_outline(glyf_table, glyph_name, num_points)
+        if outline is None:
+            # 空白字形没有轮廓可比对，也无需OCR
+            font_map[glyph_name] = " "
+            continue
+        if not templates:
+            unmatched.append(cmap_code)
+            continue
+
+        # 计算与每个模板的逐点均方距离，取最近的模板
+        distances = ((template_outlines - outline) ** 2).sum(axis=2).mean(axis=1)
+        best = int(distances.argmin())
+        if distances[best] <= threshold:
+            font_map[glyph_name] = texts[best]
+        else:
+            unmatched.append(cmap_code)
+
+    return font_map, unmatched
+
+
 """
 使用示例文档
 ===========
@@ -254,7 +864,7 @@ if __name__ == "__main__":
             # 1. 解析字体映射
             font_map = extract_text_from_font(
                 font_path,
-                image_size=512,  # 较小的图像尺寸可提高速度
+                high_quality=True,  # 以更大的图像渲染字符，速度稍慢
                 show_progress=True,
                 cache_dir="./font_cache"  # 使用缓存加速后续解析
             )
@@ -370,9 +980,18 @@ if __name__ == "__main__":
 1. 性能优化:
    - 对于大型字体文件，可使用较小的image_size来提高处理速度
    - 使用cache_dir参数缓存图像，避免重复处理相同字体
+   - 字符渲染与缩放的主要开销在Pillow中，可替换为使用SSE4/AVX2加速的Pillow-SIMD，
+     接口完全兼容，无需修改代码:
+       pip uninstall pillow
+       CC="cc -mavx2" pip install pillow-simd
    
 2. 准确率提升:
-   - 如果OCR识别不准确，可尝试调整图像大小
+   - 对于固定字形、只打乱码点的字体反爬，可用build_glyph_templates生成模板，
+     之后通过match_glyph_templates直接比对轮廓，完全跳过渲染和OCR；
+     模板为JSON友好的结构，可人工检查并修正后保存，空白字形直接映射为空格
+   - 如果OCR识别不准确，可尝试设置high_quality=True或调整图像大小
+   - INT8量化模型在复杂字符上准确率略低于FP32模型，可设置use_int8=False关闭，
+     量化模型缓存在 ~/.cache/woff_ocr/ 下，删除后会重新量化
    - 对于特定网站，可能需要手动校正部分映射结果
    
 3. 错误处理:
@@ -5,70 +5,139 @@
 并将数据存储到MySQL数据库中。
 """
 
+import hashlib
+import json
+import os
+
 import requests
-import mysql.connector
-from utils.parse_woff_font import extract_text_from_font
+from requests.adapters import HTTPAdapter
+from mysql.connector import pooling
+from utils.parse_woff_font import build_glyph_templates, extract_text_from_font, match_glyph_templates
 
+# 本地缓存目录
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dongchedi")
 
-def get_data_mapping(font_path):
+# 数字等字形模板的保存路径，首次运行时由OCR结果生成，可人工检查修正
+TEMPLATE_PATH = os.path.join(CACHE_DIR, "glyph_templates.json")
+
+# 按字体文件哈希保存的字符映射关系，CDN返回相同字体时直接复用
+FONT_MAP_DIR = os.path.join(CACHE_DIR, "font_maps")
+
+# 复用TCP/TLS连接的HTTP会话，字体下载和数据请求共用
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
+# 数据库连接配置
+DB_CONFIG = {
+    "host": "localhost",  # MySQL服务器地址
+    "user": "root",  # 用户名
+    "password": "",  # 密码
+    "database": "crawler",  # 数据库名称
+    "autocommit": False,  # 手动提交事务
+}
+
+# 数据库连接池，首次插入数据时创建
+_db_pool = None
+
+
+def get_db_pool():
     """
-    从字体文件中提取字符映射关系
+    获取数据库连接池，多次插入时复用连接，避免重复建立连接和认证
     
-    Args:
-        font_path: 字体文件路径
-        
     Returns:
-        字典，键为加密字符，值为实际数字或文字
+        MySQLConnectionPool对象
     """
-    data_mapping = {}
-    # 使用parse_woff_font模块提取字体映射
-    for key, value in extract_text_from_font(font_path).items():
-        # 将'uni'格式的键转换为对应的Unicode字符
-        data_mapping[chr(int(key[3:], 16))] = value
-    print(data_mapping)
-    return data_mapping
+    global _db_pool
+    if _db_pool is None:
+        _db_pool = pooling.MySQLConnectionPool(pool_name="crawler", pool_size=4, **DB_CONFIG)
+    return _db_pool
 
 
-def change_price(original_price: str, data_mapping):
+def is_private_use(cmap_code):
     """
-    将加密的价格转换为真实价格
+    判断码点是否位于Unicode私有使用区(U+E000-U+F8FF)，懂车帝的加密字符均位于该区域
     
     Args:
-        original_price: 加密的价格字符串
-        data_mapping: 字符映射字典
+        cmap_code: Unicode码点
         
     Returns:
-        解密后的价格字符串
+        位于私有使用区返回True
     """
-    result = ""
-    for item in original_price:
-        # 保留小数点，替换其他字符
-        if item == ".":
-            result += item
-        else:
-            result += data_mapping[item]
-    return result
+    return 0xE000 <= cmap_code <= 0xF8FF
 
 
-def change_sub_title(original_sub_title: str, data_mapping):
+def load_templates():
     """
-    将加密的副标题转换为真实文本
+    读取本地保存的字形模板
+    
+    Returns:
+        模板列表，每项为 {"text": 文本, "outline": 归一化后的轮廓坐标}，
+        文件不存在或为旧版格式时返回空列表
+    """
+    if not os.path.exists(TEMPLATE_PATH):
+        return []
+    with open(TEMPLATE_PATH, encoding='utf-8') as f:
+        templates = json.load(f)
+    # 旧版以字符为键的模板无法记录识别失败的字形，丢弃后重新生成
+    return templates if isinstance(templates, list) else []
+
+
+def save_templates(templates):
+    """
+    保存字形模板到本地
     
     Args:
-        original_sub_title: 加密的副标题字符串
-        data_mapping: 字符映射字典
+        templates: 模板列表，每项为 {"text": 文本, "outline": 归一化后的轮廓坐标}
+    """
+    os.makedirs(os.path.dirname(TEMPLATE_PATH), exist_ok=True)
+    with open(TEMPLATE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(templates, f, ensure_ascii=False)
+
+
+def get_data_mapping(font_path):
+    """
+    从字体文件中提取字符映射关系
+    
+    Args:
+        font_path: 字体文件路径
         
     Returns:
-        解密后的副标题字符串
+        字典，键为加密字符，值为实际数字或文字
     """
-    result = ""
-    for i in original_sub_title:
-        # 保留特殊字符，替换其他字符
-        if i == "." or i == "|" or i == " ":
-            result += i
-        else:
-            result += data_mapping[i]
-    return result
+    # 相同的字体文件直接读取之前保存的映射关系
+    with open(font_path, 'rb') as f:
+        font_hash = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+    font_map_path = os.path.join(FONT_MAP_DIR, f"{font_hash}.json")
+    if os.path.exists(font_map_path):
+        with open(font_map_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    data_mapping = {}
+    # 懂车帝只是打乱码点与固定字形的对应关系，优先直接比对字形轮廓与已知模板
+    templates = load_templates()
+    font_map, unmatched = match_glyph_templates(font_path, templates, codepoint_filter=is_private_use)
+
+    if unmatched:
+        # 模板未覆盖的字符使用parse_woff_font模块OCR识别，并将结果加入模板供后续字体使用；
+        # 不读取OCR结果缓存，删除模板后重新生成时不会沿用之前的错误结果
+        ocr_map = extract_text_from_font(font_path, use_cache=False, codepoint_filter=set(unmatched).__contains__)
+        font_map.update(ocr_map)
+        templates.extend(build_glyph_templates(font_path, ocr_map))
+        save_templates(templates)
+
+    for key, value in font_map.items():
+        # 将'uni'格式的键转换为对应的Unicode字符
+        data_mapping[chr(int(key[3:], 16))] = value
+    print(data_mapping)
+
+    # 保存映射关系，供之后下载到相同字体时使用；
+    # 存在识别失败的字符时不保存，这些字形也不会生成模板，下次解析该字体时重新OCR识别
+    if all(data_mapping.values()):
+        os.makedirs(FONT_MAP_DIR, exist_ok=True)
+        with open(font_map_path, 'w', encoding='utf-8') as f:
+            json.dump(data_mapping, f, ensure_ascii=False)
+
+    return data_mapping
 
 
 def insert_data(data_list):
@@ -78,22 +147,19 @@ def insert_data(data_list):
     Args:
         data_list: 包含车辆信息的字典列表
     """
-    # 创建数据库连接
-    db = mysql.connector.connect(
-        host="localhost",  # MySQL服务器地址
-        user="root",  # 用户名
-        password="",  # 密码
-        database="crawler"  # 数据库名称
-    )
+    # 从连接池获取数据库连接
+    db = get_db_pool().get_connection()
 
     # 创建游标对象，用于执行SQL查询
     cursor = db.cursor()
     try:
-        for data in data_list:
-            # 插入数据
-            sql = "INSERT INTO donchedi (title, sub_title, transfer_cnt, official_price, sh_price) VALUES (%s, %s, %s, %s, %s)"
-            val = (data['title'], data['sub_title'], data['transfer_cnt'], data['official_price'], data['sh_price'])
-            cursor.execute(sql, val)
+        # 一次性批量插入数据
+        sql = "INSERT INTO donchedi (title, sub_title, transfer_cnt, official_price, sh_price) VALUES (%s, %s, %s, %s, %s)"
+        vals = [
+            (data['title'], data['sub_title'], data['transfer_cnt'], data['official_price'], data['sh_price'])
+            for data in data_list
+        ]
+        cursor.executemany(sql, vals)
         # 提交事务
         db.commit()
         print(f"成功插入 {len(data_list)} 条数据")
@@ -101,7 +167,7 @@ def insert_data(data_list):
         print(f"数据插入失败: {e}")
         db.rollback()  # 发生错误时回滚事务
 
-    # 关闭游标和数据库连接
+    # 关闭游标，并将连接归还连接池
     cursor.close()
     db.close()
 
@@ -123,12 +189,26 @@ def get_font(font_path):
         'sec-ch-ua-mobile': '?0',
     }
 
-    # 发送GET请求下载字体文件
-    response = requests.get('https://lf6-awef.bytetos.com/obj/awesome-font/c/96fc7b50b772f52.woff2', headers=headers)
-
-    # 保存字体文件到本地
-    with open(font_path, 'wb') as f:
-        f.write(response.content)
+    # 发送GET请求下载字体文件，以流式方式分块写入本地
+    with SESSION.get(
+            'https://lf6-awef.bytetos.com/obj/awesome-font/c/96fc7b50b772f52.woff2',
+            headers=headers,
+            stream=True,
+            timeout=10
+    ) as response:
+        response.raise_for_status()
+
+        size = 0
+        with open(font_path, 'wb') as f:
+            for chunk in response.iter_content(64 * 1024):
+                f.write(chunk)
+                size += len(chunk)
+
+        # 校验下载的字节数与Content-Length一致（响应经过压缩时iter_content返回解压后的数据，无法比较）
+        content_length = response.headers.get('Content-Length')
+        compressed = response.headers.get('Content-Encoding')
+        if content_length is not None and not compressed and size != int(content_length):
+            raise ValueError(f"字体文件下载不完整: 期望 {content_length} 字节，实际 {size} 字节")
     
     print(f"字体文件已下载到: {font_path}")
 
@@ -190,7 +270,7 @@ def get_data_list(data_mapping):
     data = '&sh_city_name=全国&page=1&limit=20'.encode()
 
     # 发送POST请求获取二手车列表数据
-    response = requests.post(
+    response = SESSION.post(
         'https://www.dongchedi.com/motor/pc/sh/sh_sku_list',
         params=params,
         cookies=cookies,
@@ -198,15 +278,18 @@ def get_data_list(data_mapping):
         data=data,
     )
 
+    # 构建字符转换表，未在映射中的字符（如小数点、分隔符、空格）保持不变
+    trans = str.maketrans(data_mapping)
+
     # 解析响应数据
     data_list = []
     for data in response.json()['data']['search_sh_sku_info_list']:
         # 提取车辆信息并解密
         title = data['title']  # 标题通常不加密
-        sub_title = change_sub_title(data['sub_title'], data_mapping)  # 解密副标题
+        sub_title = data['sub_title'].translate(trans)  # 解密副标题
         transfer_cnt = data['transfer_cnt']  # 过户次数
-        official_price = change_price(data['official_price'], data_mapping)  # 解密官方指导价
-        sh_price = change_price(data['sh_price'], data_mapping)  # 解密二手车价格
+        official_price = data['official_price'].translate(trans)  # 解密官方指导价
+        sh_price = data['sh_price'].translate(trans)  # 解密二手车价格
         
         # 将解密后的数据添加到结果列表
         data_list.append({
@@ -272,6 +355,12 @@ if __name__ == '__main__':
 3. 反爬机制说明:
    懂车帝网站采用自定义字体映射进行数据加密，主要针对价格和车辆信息。
    本脚本通过下载并解析其字体文件来破解这一保护机制。
+   由于每次下发的字体只是打乱码点与固定字形的对应关系，首次运行时OCR识别的结果会保存为
+   字形模板(~/.cache/dongchedi/glyph_templates.json)，之后直接比对字形轮廓，无需再次OCR。
+   若OCR识别有误，可修正或删除该文件。
+   每个字体文件解析出的映射关系按文件哈希缓存在 ~/.cache/dongchedi/font_maps/ 下，
+   修正模板后需一并删除该目录。生成模板时不读取parse_woff_font的OCR结果缓存
+   (~/.cache/woff_ocr/glyphs.db)，删除上述文件后会重新OCR识别。
 
 4. 可扩展功能:
    - 增加翻页功能获取更多数据